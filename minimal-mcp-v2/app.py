@@ -18,4 +18,6 @@ app = Starlette(lifespan=lifespan, routes=[Mount("/", app=mcp_app)])
 
 if __name__ == "__main__":
     import uvicorn
+    # loop/http default to "auto": uvloop and httptools are used when installed
+    # (uvicorn[standard]) and plain asyncio / h11 otherwise
     uvicorn.run("app:app", host="0.0.0.0", port=8000)
@@ -1,22 +1,31 @@
 # config.py
 import os
+from dataclasses import dataclass, field
 from typing import Optional
 
+@dataclass(frozen=True, slots=True)
 class Settings:
     RANCHER_URL: str
-    RANCHER_TOKEN: str
+    RANCHER_TOKEN: str = field(repr=False)
     RANCHER_CA_BUNDLE: Optional[str]
     HTTP_TIMEOUT: float
     MAX_RETRIES: int
+    MAX_INFLIGHT: int
 
-    def __init__(self) -> None:
-        self.RANCHER_URL = os.environ.get("RANCHER_URL", "").rstrip("/")
-        self.RANCHER_TOKEN = os.environ.get("RANCHER_TOKEN", "")
-        self.RANCHER_CA_BUNDLE = os.environ.get("RANCHER_CA_BUNDLE")  # path to CA file, optional
-        self.HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", "15"))
-        self.MAX_RETRIES = int(os.environ.get("MAX_RETRIES", "3"))
-
+    def __post_init__(self) -> None:
         if not self.RANCHER_URL or not self.RANCHER_TOKEN:
             raise RuntimeError("RANCHER_URL and RANCHER_TOKEN must be set")
 
-settings = Settings()
+def _load_settings() -> Settings:
+    env = os.environ
+    return Settings(
+        RANCHER_URL=env.get("RANCHER_URL", "").rstrip("/"),
+        RANCHER_TOKEN=env.get("RANCHER_TOKEN", ""),
+        RANCHER_CA_BUNDLE=env.get("RANCHER_CA_BUNDLE"),  # path to CA file, optional
+        HTTP_TIMEOUT=float(env.get("HTTP_TIMEOUT", "15")),
+        MAX_RETRIES=int(env.get("MAX_RETRIES", "3")),
+        MAX_INFLIGHT=int(env.get("RANCHER_MAX_INFLIGHT", "16")),  # concurrent requests to Rancher
+    )
+
+# Parsed once at import; immutable afterwards.
+settings = _load_settings()
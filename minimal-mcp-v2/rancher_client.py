@@ -1,10 +1,214 @@
 # rancher_client.py
 import asyncio
-from typing import Any, AsyncIterator, Dict, Iterable, Optional
+import random
+import time
+from collections import OrderedDict, deque
+from contextlib import aclosing
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Optional, Tuple
 import httpx
-from urllib.parse import urljoin
+import ijson
+import orjson
 from config import settings
 
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+BACKOFF_BASE = 0.25  # seconds
+BACKOFF_CAP = 30.0   # seconds, also caps Retry-After
+CLUSTER_CACHE_TTL = 300.0  # seconds a resolved cluster name stays valid
+DECODE_OFFLOAD_BYTES = 1 << 20  # bodies larger than this are decoded in a worker thread
+ETAG_CACHE_SIZE = 64  # Rancher v3 responses kept for If-None-Match revalidation
+
+def _retry_after(resp: httpx.Response) -> Optional[float]:
+    """
+    Parse a Retry-After header (delta-seconds or HTTP-date), clipped to BACKOFF_CAP.
+    """
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        delay = float(int(value))
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        delay = (when - datetime.now(timezone.utc)).total_seconds()
+    return min(max(delay, 0.0), BACKOFF_CAP)
+
+async def _decode(body: bytes) -> Any:
+    # large bodies are decoded in a worker thread to keep the event loop free
+    if len(body) > DECODE_OFFLOAD_BYTES:
+        return await asyncio.to_thread(orjson.loads, body)
+    return orjson.loads(body)
+
+_CLUSTER_ID_PREFIXES = ("c-",)  # covers c-xxxxx and v2-provisioned c-m-xxxxxxxx
+
+def _is_cluster_id(s: str) -> bool:
+    # "local" is the Rancher management cluster's fixed id; project ids contain ':'
+    return ":" in s or s == "local" or s.startswith(_CLUSTER_ID_PREFIXES)
+
+_K8S_CACHED_READ = {"resourceVersion": "0", "resourceVersionMatch": "NotOlderThan"}
+
+def _k8s_params(params: Optional[Dict[str, Any]], cached: bool) -> Optional[Dict[str, Any]]:
+    """
+    Merge watch-cache read options under the caller's params. A 'continue' request
+    already pins its snapshot, and the apiserver rejects resourceVersion with it.
+    """
+    if not cached or (params and "continue" in params):
+        return params
+    return {**_K8S_CACHED_READ, **(params or {})}
+
+class AdaptiveLimiter:
+    """
+    Concurrency gate for outbound requests (AIMD): the limit halves on a 429 and
+    grows back by one slot after `limit` non-throttled responses, up to max_limit.
+    A 429 only counts if its request was sent after the last decrease (same
+    `epoch`), so one burst of throttled responses cuts the limit once.
+    RetryTransport holds a slot from sending the request until the response body
+    is closed, so streamed responses count for as long as they are being read.
+    """
+    def __init__(self, max_limit: int) -> None:
+        self.max_limit = max(1, max_limit)
+        self.limit = self.max_limit
+        self._active = 0
+        self._successes = 0
+        self.epoch = 0  # bumped on every decrease
+        self._waiters: Deque["asyncio.Future[None]"] = deque()
+
+    async def acquire(self) -> None:
+        if self._active < self.limit and not self._waiters:
+            self._active += 1
+            return
+        fut: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # slot was handed over just as we were cancelled; give it back
+                self.release()
+            raise
+
+    def release(self) -> None:
+        self._active -= 1
+        self._wake()
+
+    def throttled(self, sent_epoch: int) -> None:
+        if sent_epoch != self.epoch:
+            return  # already backed off for this congestion episode
+        self.limit = max(1, self.limit // 2)
+        self._successes = 0
+        self.epoch += 1
+
+    def succeeded(self) -> None:
+        if self.limit >= self.max_limit:
+            return
+        self._successes += 1
+        if self._successes >= self.limit:
+            self.limit += 1
+            self._successes = 0
+            self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self._active < self.limit:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                self._active += 1
+                fut.set_result(None)
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body wrapper that frees its limiter slot once the body is closed."""
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]) -> None:
+        self._stream = stream
+        self._release: Optional[Callable[[], None]] = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            release, self._release = self._release, None
+            if release is not None:
+                release()
+
+class RetryTransport(httpx.AsyncBaseTransport):
+    """
+    Wraps another async transport and retries 429 / 5xx / transport errors
+    with full-jitter backoff, so the wrapped connection pool stays warm.
+    """
+    def __init__(
+        self,
+        wrapped: httpx.AsyncBaseTransport,
+        max_retries: int = 3,
+        base: float = BACKOFF_BASE,
+        cap: float = BACKOFF_CAP,
+        max_inflight: int = 16,
+    ) -> None:
+        self._wrapped = wrapped
+        self.max_retries = max(1, max_retries)
+        self.base = base
+        self.cap = cap
+        self._limiter = AdaptiveLimiter(max_inflight)
+
+    async def _send(self, request: httpx.Request) -> httpx.Response:
+        # The slot covers one attempt until its body is read or closed (httpx closes
+        # it after reading, or on leaving a stream() block); backoff sleeps happen
+        # outside it so waiting retries don't block other requests.
+        await self._limiter.acquire()
+        sent_epoch = self._limiter.epoch
+        try:
+            resp = await self._wrapped.handle_async_request(request)
+        except BaseException:
+            self._limiter.release()
+            raise
+        if resp.status_code == 429:
+            self._limiter.throttled(sent_epoch)
+        elif resp.status_code < 500:
+            self._limiter.succeeded()
+        assert isinstance(resp.stream, httpx.AsyncByteStream)
+        return httpx.Response(
+            resp.status_code,
+            headers=resp.headers,
+            stream=_ReleasingStream(resp.stream, self._limiter.release),
+            extensions=resp.extensions,
+        )
+
+    def _backoff(self, attempt: int, resp: Optional[httpx.Response]) -> float:
+        if resp is not None and resp.status_code in (429, 503):
+            delay = _retry_after(resp)
+            if delay is not None:
+                return delay
+        # full jitter: uniform(0, min(cap, base * 2^n))
+        return random.random() * min(self.cap, self.base * (2 ** (attempt - 1)))
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        for attempt in range(1, self.max_retries):
+            resp: Optional[httpx.Response] = None
+            try:
+                resp = await self._send(request)
+            except httpx.TransportError:
+                pass
+            else:
+                # Retry on 429 / 5xx; anything else (incl. other 4xx) goes straight back
+                if resp.status_code not in RETRYABLE_STATUS:
+                    return resp
+            delay = self._backoff(attempt, resp)
+            if resp is not None:
+                await resp.aclose()
+            await asyncio.sleep(delay)
+        # Last attempt: transport errors propagate and a retryable status is
+        # returned as-is so the caller's raise_for_status() reports it.
+        return await self._send(request)
+
+    async def aclose(self) -> None:
+        await self._wrapped.aclose()
+
 class AsyncRancher:
     """
     Reusable async client for Rancher and its Kubernetes proxy.
@@ -16,22 +220,48 @@ class AsyncRancher:
         ca_bundle: Optional[str],
         timeout: float = 15.0,
         max_retries: int = 3,
+        max_inflight: int = 16,
     ) -> None:
         self.base_url = base_url
+        # Precomputed roots: paths are plain relative strings, so concatenation
+        # gives the same result as urljoin without re-parsing the URL per call.
+        self._base = base_url.rstrip("/") + "/"
+        self._k8s_root = self._base + "k8s/clusters/"
         self.token = token
         self.ca_bundle = ca_bundle
         self.timeout = timeout
         self.max_retries = max_retries
+        self.max_inflight = max_inflight
         self._client: Optional[httpx.AsyncClient] = None
+        self._cluster_cache: Dict[str, Tuple[float, str]] = {}
+        self._cluster_lock = asyncio.Lock()
+        self._inflight: Dict[Tuple[str, str], "asyncio.Future[bytes]"] = {}
+        # (url, params) -> (ETag, raw body), least recently used first
+        self._etag_cache: "OrderedDict[Tuple[str, str], Tuple[str, bytes]]" = OrderedDict()
 
     async def start(self) -> None:
         if self._client is None:
             headers = {"Authorization": f"Bearer {self.token}"}
+            # The client ignores http2/limits when given a transport, so tune the pool here.
+            # Many small GETs to one Rancher host multiplex well over a single HTTP/2 connection.
+            transport = RetryTransport(
+                httpx.AsyncHTTPTransport(
+                    verify=self.ca_bundle if self.ca_bundle else True,
+                    http2=True,
+                    limits=httpx.Limits(
+                        max_keepalive_connections=32,
+                        max_connections=64,
+                        keepalive_expiry=60,
+                    ),
+                ),
+                max_retries=self.max_retries,
+                max_inflight=self.max_inflight,
+            )
             self._client = httpx.AsyncClient(
                 base_url=self.base_url,
                 headers=headers,
                 timeout=self.timeout,
-                verify=self.ca_bundle if self.ca_bundle else True,
+                transport=transport,
             )
 
     async def close(self) -> None:
@@ -39,94 +269,240 @@ class AsyncRancher:
             await self._client.aclose()
             self._client = None
 
-    # ---------- Internal retry wrapper ----------
-    async def _request(
-        self, method: str, url: str, **kwargs: Any
-    ) -> httpx.Response:
+    # ---------- Shared GET ----------
+    async def _fetch_body(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        etag_key: Optional[Tuple[str, str]] = None,
+        **kwargs: Any,
+    ) -> bytes:
         assert self._client, "Client not started"
-        last_exc: Optional[Exception] = None
-        for attempt in range(1, self.max_retries + 1):
-            try:
-                resp = await self._client.request(method, url, **kwargs)
-                # Retry on 429 / 5xx
-                if resp.status_code in (429, 500, 502, 503, 504):
-                    raise httpx.HTTPStatusError("retryable status", request=resp.request, response=resp)
-                return resp
-            except (httpx.TransportError, httpx.HTTPStatusError) as e:
-                last_exc = e
-                # backoff: 0.25s, 0.5s, 1s...
-                await asyncio.sleep(0.25 * (2 ** (attempt - 1)))
-        assert last_exc
-        raise last_exc
+        cached = self._etag_cache.get(etag_key) if etag_key is not None else None
+        if cached is not None:
+            kwargs["headers"] = {"If-None-Match": cached[0]}
+        resp = await self._client.request("GET", url, params=params, **kwargs)
+        if cached is not None and resp.status_code == 304:
+            # the entry may have been evicted while the request was in flight
+            self._remember_etag(etag_key, cached)
+            return cached[1]
+        resp.raise_for_status()
+        if etag_key is not None:
+            etag = resp.headers.get("ETag")
+            if etag:
+                self._remember_etag(etag_key, (etag, resp.content))
+            else:
+                self._etag_cache.pop(etag_key, None)
+        return resp.content
+
+    def _remember_etag(self, key: Tuple[str, str], entry: Tuple[str, bytes]) -> None:
+        self._etag_cache[key] = entry
+        self._etag_cache.move_to_end(key)
+        while len(self._etag_cache) > ETAG_CACHE_SIZE:
+            self._etag_cache.popitem(last=False)
+
+    async def _get_json(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        revalidate: bool = False,
+        **kwargs: Any,
+    ) -> Any:
+        """
+        GET and decode JSON. Concurrent identical GETs (same url and params) share
+        one request, and with revalidate=True (Rancher v3 only) unchanged resources
+        are revalidated with If-None-Match. Only the raw body is shared; every
+        caller decodes its own object.
+        """
+        if kwargs:
+            # extra request options (headers, timeout...) make the call non-shareable
+            return await _decode(await self._fetch_body(url, params, **kwargs))
+        # normalized query string: order-stable and works for list-valued params
+        key = (url, str(httpx.QueryParams(params)))
+        task = self._inflight.get(key)
+        if task is None:
+            etag_key = key if revalidate else None
+            task = asyncio.ensure_future(self._fetch_body(url, params, etag_key=etag_key))
+            self._inflight[key] = task
+
+            def _done(t: "asyncio.Future[bytes]", key: Tuple[str, str] = key) -> None:
+                self._inflight.pop(key, None)
+                if not t.cancelled():
+                    t.exception()  # mark retrieved even if every waiter went away
+
+            task.add_done_callback(_done)
+        # shield: one caller being cancelled must not cancel the shared request
+        return await _decode(await asyncio.shield(task))
 
     # ---------- Rancher (v3) ----------
     async def rancher_get(self, path: str, **kwargs: Any) -> Dict[str, Any]:
         """
         path like '/v3/clusters' (leading slash ok). Returns JSON or raises.
         """
-        url = urljoin(self.base_url + "/", path.lstrip("/"))
-        resp = await self._request("GET", url, **kwargs)
-        resp.raise_for_status()
-        return resp.json()
+        url = self._base + path.lstrip("/")
+        return await self._get_json(url, revalidate=True, **kwargs)
 
-    async def rancher_list_all(self, path: str, page_size: int = 100) -> Iterable[Dict[str, Any]]:
+    async def rancher_list_all(
+        self, path: str, page_size: int = 100, prefetch: int = 2
+    ) -> AsyncIterator[Dict[str, Any]]:
         """
         Iterate all items across Rancher pagination (v3 APIs).
+        v3 'next' links carry an opaque marker, so pages can't be requested out of
+        order; instead a background task fetches ahead of the consumer, holding up
+        to `prefetch` finished pages in a queue while fetching one more.
         """
-        url = urljoin(self.base_url + "/", path.lstrip("/"))
-        params = {"limit": page_size}
-        while True:
-            resp = await self._request("GET", url, params=params)
-            resp.raise_for_status()
-            data = resp.json()
-            # Common shape: {'data': [...], 'links': {'next': ...}}
-            items = data.get("data") or []
-            for item in items:
-                yield item
-            next_url = (data.get("links") or {}).get("next")
-            if not next_url:
-                break
-            url = next_url
-            params = {}  # next link already contains paging
+        queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, prefetch))
+
+        async def produce() -> None:
+            url: Optional[str] = self._base + path.lstrip("/")
+            params: Optional[Dict[str, Any]] = {"limit": page_size}
+            try:
+                while url:
+                    data = await self._get_json(url, params, revalidate=True)
+                    # Common shape: {'data': [...], 'links': {'next': ...}}
+                    await queue.put(data.get("data") or [])
+                    url = (data.get("links") or {}).get("next")
+                    params = None  # next link already contains paging; {} would strip its query
+            except Exception as e:
+                await queue.put(e)
+            else:
+                await queue.put(None)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                page = await queue.get()
+                if page is None:
+                    break
+                if isinstance(page, Exception):
+                    raise page
+                for item in page:
+                    yield item
+        finally:
+            producer.cancel()
+
+    def _cached_cluster_id(self, name: str) -> Optional[str]:
+        entry = self._cluster_cache.get(name)
+        if entry is None:
+            return None
+        ts, cid = entry
+        if time.monotonic() - ts >= CLUSTER_CACHE_TTL:
+            self._cluster_cache.pop(name, None)
+            return None
+        return cid
 
     async def resolve_cluster_id(self, name_or_id: str) -> str:
         """
         Accepts either a Rancher cluster ID or a displayName; returns the cluster ID.
+        Name lookups are cached for CLUSTER_CACHE_TTL seconds.
         """
-        # If it looks like an ID, just return it
-        if ":" in name_or_id or name_or_id.startswith("c-"):
+        # If it looks like an ID, just return it (before any cache lookup or lock)
+        if _is_cluster_id(name_or_id):
             return name_or_id
-        # Otherwise, search clusters by name
-        async for c in self.rancher_list_all("/v3/clusters"):
-            if c.get("name") == name_or_id or c.get("displayName") == name_or_id:
+        cid = self._cached_cluster_id(name_or_id)
+        if cid:
+            return cid
+        # Otherwise, search clusters by name; one caller refills the cache for everyone
+        async with self._cluster_lock:
+            cid = self._cached_cluster_id(name_or_id)
+            if cid:
+                return cid
+            now = time.monotonic()
+            cache: Dict[str, Tuple[float, str]] = {}
+            async for c in self.rancher_list_all("/v3/clusters"):
                 cid = c.get("id")
-                if cid:
-                    return cid
+                if not cid:
+                    continue
+                for key in (c.get("name"), c.get("displayName")):
+                    if key and key not in cache:
+                        cache[key] = (now, cid)
+            self._cluster_cache = cache
+        cid = self._cached_cluster_id(name_or_id)
+        if cid:
+            return cid
         raise ValueError(f"Cluster not found: {name_or_id}")
 
     # ---------- Kubernetes via Rancher proxy ----------
-    def _k8s_base(self, cluster_id: str) -> str:
+    def _k8s_url(self, cluster_id: str, k8s_path: str) -> str:
         # K8s proxy root for a cluster:
         #   /k8s/clusters/{clusterId}/
-        return f"/k8s/clusters/{cluster_id}/"
+        return f"{self._k8s_root}{cluster_id}/{k8s_path.lstrip('/')}"
 
-    async def k8s_get(self, cluster_id: str, k8s_path: str, **kwargs: Any) -> Dict[str, Any]:
+    async def k8s_get(
+        self,
+        cluster_id: str,
+        k8s_path: str,
+        params: Optional[Dict[str, Any]] = None,
+        cached: bool = False,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
         """
         k8s_path like 'api/v1/namespaces/kube-system/pods'
+        cached=True lets the apiserver answer a LIST from its watch cache.
         """
-        base = self._k8s_base(cluster_id)
-        url = urljoin(self.base_url + "/", (base + k8s_path.lstrip("/")))
-        resp = await self._request("GET", url, **kwargs)
-        resp.raise_for_status()
-        return resp.json()
+        url = self._k8s_url(cluster_id, k8s_path)
+        return await self._get_json(url, _k8s_params(params, cached), **kwargs)
+
+    async def k8s_list_all(
+        self, cluster_id: str, k8s_path: str, limit: int = 500, cached: bool = True
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Iterate all items of a Kubernetes list, `limit` per page, following the
+        'continue' token. With cached=True the first page is served from the
+        apiserver watch cache. Each page is stream-parsed, so only one item is
+        materialized at a time.
+        """
+        assert self._client, "Client not started"
+        url = self._k8s_url(cluster_id, k8s_path)
+        params = _k8s_params({"limit": limit}, cached)
+        while True:
+            items = ijson.sendable_list()
+            tokens = ijson.sendable_list()
+            item_parser = ijson.items_coro(items, "items.item", use_float=True)
+            # The apiserver writes metadata before items, so the token parser
+            # can be dropped as soon as the first item shows up.
+            token_parser = ijson.items_coro(tokens, "metadata.continue")
+            async with self._client.stream("GET", url, params=params) as resp:
+                resp.raise_for_status()
+                async for chunk in resp.aiter_bytes():
+                    if token_parser is not None:
+                        token_parser.send(chunk)
+                    item_parser.send(chunk)
+                    if token_parser is not None and (tokens or items):
+                        token_parser = None
+                    for item in items:
+                        yield item
+                    del items[:]
+            item_parser.close()
+            for item in items:
+                yield item
+            token = tokens[0] if tokens else None
+            if not token:
+                break
+            params = _k8s_params({"limit": limit, "continue": token}, cached)
 
-    async def list_pods(self, cluster: str, namespace: Optional[str] = None) -> Dict[str, Any]:
+    async def list_pods(
+        self,
+        cluster: str,
+        namespace: Optional[str] = None,
+        limit: int = 500,
+        cached: bool = True,
+    ) -> AsyncIterator[Dict[str, Any]]:
         """
-        Returns a Kubernetes PodList. 'cluster' can be name or id.
+        Iterate pods page by page. 'cluster' can be name or id.
         """
         cid = await self.resolve_cluster_id(cluster)
         path = "api/v1/pods" if not namespace else f"api/v1/namespaces/{namespace}/pods"
-        return await self.k8s_get(cid, path)
+        try:
+            # close the page stream (and its limiter slot) as soon as the caller stops
+            async with aclosing(self.k8s_list_all(cid, path, limit=limit, cached=cached)) as pods:
+                async for pod in pods:
+                    yield pod
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                # cluster may have been removed or renamed; don't keep serving a stale id
+                self._cluster_cache.pop(cluster, None)
+            raise
 
 # ---------- Singleton factory ----------
 _rancher_singleton: Optional[AsyncRancher] = None
@@ -140,6 +516,7 @@ async def get_rancher() -> AsyncRancher:
             ca_bundle=settings.RANCHER_CA_BUNDLE,
             timeout=settings.HTTP_TIMEOUT,
             max_retries=settings.MAX_RETRIES,
+            max_inflight=settings.MAX_INFLIGHT,
         )
         await _rancher_singleton.start()
     return _rancher_singleton
@@ -0,0 +1,254 @@
+# tests/test_rancher_client.py
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("RANCHER_URL", "https://r.example")
+os.environ.setdefault("RANCHER_TOKEN", "test-token")
+
+from rancher_client import BACKOFF_CAP, AdaptiveLimiter, AsyncRancher, _retry_after  # noqa: E402
+
+
+def _run(handler, body, **kwargs):
+    """Run body(client) against an AsyncRancher whose network is a MockTransport."""
+    async def go():
+        client = AsyncRancher("https://r.example", "test-token", None, **kwargs)
+        await client.start()
+        # keep RetryTransport (retries, limiter) and replace only the HTTP layer
+        client._client._transport._wrapped = httpx.MockTransport(handler)
+        try:
+            return await body(client)
+        finally:
+            await client.close()
+    return asyncio.run(go())
+
+
+def _limiter(client) -> AdaptiveLimiter:
+    return client._client._transport._limiter
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record backoff delays instead of sleeping."""
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(delay, *args, **kwargs):
+        delays.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+    return delays
+
+
+def test_rancher_list_all_follows_next_link_query() -> None:
+    # Regression: following links.next with params={} made httpx drop the marker,
+    # so page one was refetched forever.
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.url)
+        if len(seen) > 5:
+            raise AssertionError(f"pagination did not terminate: {seen}")
+        if request.url.params.get("marker") == "x":
+            return httpx.Response(200, json={"data": [{"id": "c-2"}], "links": {}})
+        return httpx.Response(200, json={
+            "data": [{"id": "c-1"}],
+            "links": {"next": "https://r.example/v3/clusters?limit=1&marker=x"},
+        })
+
+    async def body(client):
+        return [c["id"] async for c in client.rancher_list_all("/v3/clusters", page_size=1)]
+
+    assert _run(handler, body) == ["c-1", "c-2"]
+    assert [str(u) for u in seen] == [
+        "https://r.example/v3/clusters?limit=1",
+        "https://r.example/v3/clusters?limit=1&marker=x",
+    ]
+
+
+def test_get_accepts_list_valued_params() -> None:
+    # Regression: the coalescing key used frozenset(params.items()) -> TypeError.
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"selectors": request.url.params.get_list("labelSelector")})
+
+    async def body(client):
+        return await client.k8s_get("c-1", "api/v1/pods", params={"labelSelector": ["a", "b"]})
+
+    assert _run(handler, body) == {"selectors": ["a", "b"]}
+
+
+def test_concurrent_gets_share_one_request_but_not_the_object() -> None:
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url)
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json={"data": [1, 2]})
+
+    async def body(client):
+        return await asyncio.gather(*(client.rancher_get("/v3/clusters") for _ in range(3)))
+
+    results = _run(handler, body)
+    assert len(calls) == 1
+    assert results[0] == results[1] == results[2] == {"data": [1, 2]}
+    results[0]["data"].append(3)
+    assert results[1] == {"data": [1, 2]}
+
+
+def test_retry_after_parsing() -> None:
+    def resp(value):
+        return httpx.Response(429, headers={"Retry-After": value} if value is not None else {})
+
+    assert _retry_after(resp("3")) == 3.0
+    assert _retry_after(resp("3600")) == BACKOFF_CAP
+    assert _retry_after(resp(None)) is None
+    assert _retry_after(resp("soon")) is None
+    future = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=10), usegmt=True)
+    assert 8.0 <= _retry_after(resp(future)) <= 10.0
+    past = format_datetime(datetime.now(timezone.utc) - timedelta(seconds=10), usegmt=True)
+    assert _retry_after(resp(past)) == 0.0
+
+
+def test_retries_honor_retry_after_and_free_slots(sleeps) -> None:
+    statuses = [
+        httpx.Response(429, headers={"Retry-After": "2"}),
+        httpx.Response(503),
+        httpx.Response(200, json={"ok": True}),
+    ]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return statuses.pop(0)
+
+    async def body(client):
+        result = await client.rancher_get("/v3/settings")
+        return result, _limiter(client)._active
+
+    result, active = _run(handler, body, max_retries=3)
+    assert result == {"ok": True}
+    assert active == 0
+    assert sleeps[0] == 2.0                  # Retry-After from the 429
+    assert 0.0 <= sleeps[1] <= 0.5           # jitter for attempt 2: [0, 0.25 * 2)
+
+
+def test_last_attempt_returns_retryable_status(sleeps) -> None:
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url)
+        return httpx.Response(503)
+
+    async def body(client):
+        with pytest.raises(httpx.HTTPStatusError) as exc:
+            await client.rancher_get("/v3/settings")
+        return exc.value.response.status_code, _limiter(client)._active
+
+    assert _run(handler, body, max_retries=2) == (503, 0)
+    assert len(calls) == 2
+    assert len(sleeps) == 1
+
+
+def test_last_attempt_transport_error_propagates(sleeps) -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("refused", request=request)
+
+    async def body(client):
+        with pytest.raises(httpx.ConnectError):
+            await client.rancher_get("/v3/settings")
+        return _limiter(client)._active
+
+    assert _run(handler, body, max_retries=2) == 0
+
+
+def test_slot_held_until_body_closed() -> None:
+    # Regression: the slot used to be released as soon as headers arrived.
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=b'{"items": []}')
+
+    async def body(client):
+        limiter = _limiter(client)
+        async with client._client.stream("GET", "https://r.example/v3/clusters") as resp:
+            during = limiter._active
+            await resp.aread()
+        return during, limiter._active
+
+    assert _run(handler, body) == (1, 0)
+
+
+def test_throttled_burst_halves_limit_once() -> None:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.01)
+        return httpx.Response(429)
+
+    async def body(client):
+        results = await asyncio.gather(
+            *(client.rancher_get(f"/v3/clusters/c-{i}") for i in range(16)),
+            return_exceptions=True,
+        )
+        assert all(isinstance(r, httpx.HTTPStatusError) for r in results)
+        return _limiter(client).limit
+
+    assert _run(handler, body, max_retries=1, max_inflight=16) == 8
+
+
+def test_limiter_additive_increase() -> None:
+    limiter = AdaptiveLimiter(4)
+    limiter.throttled(limiter.epoch)
+    assert limiter.limit == 2
+    limiter.throttled(0)   # sent before the decrease: same episode, ignored
+    assert limiter.limit == 2
+    limiter.succeeded()
+    assert limiter.limit == 2
+    limiter.succeeded()    # `limit` successes grow it by one
+    assert limiter.limit == 3
+
+
+def test_not_modified_after_eviction(monkeypatch) -> None:
+    # Regression: a 304 whose cache entry was evicted mid-flight raised KeyError.
+    import rancher_client
+    monkeypatch.setattr(rancher_client, "ETAG_CACHE_SIZE", 2)
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.headers.get("If-None-Match"):
+            await asyncio.sleep(0.02)  # let the other GETs evict this entry first
+            return httpx.Response(304)
+        path = request.url.path
+        return httpx.Response(200, json={"path": path}, headers={"ETag": f'"{path}"'})
+
+    async def body(client):
+        await client.rancher_get("/v3/a")
+        results = await asyncio.gather(
+            client.rancher_get("/v3/a"), client.rancher_get("/v3/b"), client.rancher_get("/v3/c")
+        )
+        return results, len(client._etag_cache)
+
+    results, cached = _run(handler, body)
+    assert results == [{"path": "/v3/a"}, {"path": "/v3/b"}, {"path": "/v3/c"}]
+    assert cached == 2
+
+
+def test_k8s_list_all_follows_continue_token() -> None:
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        params = dict(request.url.params)
+        seen.append(params)
+        if params.get("continue") == "tok":
+            return httpx.Response(200, json={"metadata": {}, "items": [{"n": 3}]})
+        return httpx.Response(200, json={"metadata": {"continue": "tok"}, "items": [{"n": 1}, {"n": 2}]})
+
+    async def body(client):
+        return [pod["n"] async for pod in client.list_pods("c-1", limit=2)]
+
+    assert _run(handler, body) == [1, 2, 3]
+    # first page comes from the watch cache; the continuation must not pin a resourceVersion
+    assert seen == [
+        {"limit": "2", "resourceVersion": "0", "resourceVersionMatch": "NotOlderThan"},
+        {"limit": "2", "continue": "tok"},
+    ]
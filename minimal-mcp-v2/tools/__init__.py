@@ -1,13 +1,16 @@
 # tools/__init__.py
-import importlib
-import pkgutil
+from importlib import import_module
+
+# Tool modules to register, imported in order at startup.
+# Listed explicitly so boot doesn't scan the package directory; add new tool files here.
+_TOOLS = (
+    "ping",
+    "pong",
+    "rancher_tools",
+)
 
-# Auto-import all immediate child modules in this package
 __all__ = []
 
-for finder, name, ispkg in pkgutil.iter_modules(__path__):  # type: ignore[name-defined]
-    if ispkg:
-        # optional: recurse into subpackages if you want
-        continue
-    module = importlib.import_module(f"{__name__}.{name}")
+for name in _TOOLS:
+    import_module(f"{__name__}.{name}")
     __all__.append(name)   # so `from tools import *` exports module objects
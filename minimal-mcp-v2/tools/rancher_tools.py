@@ -1,46 +1,88 @@
 # tools/rancher_tools.py
+from contextlib import aclosing
 from typing import Optional
 from app import mcp
 from rancher_client import get_rancher
 
+# (output key, path into the API object), resolved once by _project
+_CLUSTER_FIELDS = (
+    ("id", ("id",)),
+    ("name", ("name",)),
+    ("displayName", ("displayName",)),
+    ("state", ("state",)),
+    ("version", ("rancherKubernetesEngineConfig", "kubernetesVersion")),
+)
+# pod columns copied as-is; "ready" is computed from _CONTAINER_STATUSES
+_POD_FIELDS = (
+    ("name", ("metadata", "name")),
+    ("namespace", ("metadata", "namespace")),
+    ("status", ("status", "phase")),
+    ("age", ("metadata", "creationTimestamp")),
+)
+_CONTAINER_STATUSES = ("status", "containerStatuses")
+
+def _walk(obj: dict, path: tuple):
+    """Follow path into obj; a missing or non-dict hop yields None."""
+    v = obj
+    for p in path:
+        if not isinstance(v, dict):
+            return None
+        v = v.get(p)
+    return v
+
+def _project(obj: dict, fields: tuple) -> dict:
+    """Pick nested fields out of obj by (output key, path) pairs."""
+    return {key: _walk(obj, path) for key, path in fields}
+
+def _shape_pod(pod: dict) -> dict:
+    """Reduce a raw Pod object to a kubectl-style row."""
+    pod_info = _project(pod, _POD_FIELDS)
+    # count ready containers in one pass over containerStatuses
+    cs = _walk(pod, _CONTAINER_STATUSES) or ()
+    ready = 0
+    for c in cs:
+        if c.get("ready"):
+            ready += 1
+    pod_info["ready"] = f"{ready}/{len(cs)}"
+    return pod_info
+
 @mcp.tool()
 async def rancher_clusters() -> list[dict]:
     """List Rancher clusters (basic fields)."""
     client = await get_rancher()
-    clusters = []
-    async for c in client.rancher_list_all("/v3/clusters"):
-        clusters.append({
-            "id": c.get("id"),
-            "name": c.get("name"),
-            "displayName": c.get("displayName"),
-            "state": c.get("state"),
-            "version": (c.get("rancherKubernetesEngineConfig") or {}).get("kubernetesVersion"),
-        })
-    return clusters
+    return [_project(c, _CLUSTER_FIELDS) async for c in client.rancher_list_all("/v3/clusters")]
 
 @mcp.tool()
-async def k8s_pods(cluster: str, namespace: Optional[str] = None) -> list[dict]:
+async def k8s_pods(
+    cluster: str, namespace: Optional[str] = None, max_items: int = 1000
+) -> dict:
     """
     Get simplified list of pods via Rancher k8s proxy.
     Args:
         cluster: Rancher cluster ID (e.g., 'c-abcde') or display name
-        namespace: Optional namespace to filter pods. If None, lists pods from all namespaces.
+        namespace: Optional namespace to filter pods. If None, lists pods from all
+            namespaces (still subject to max_items).
+        max_items: Maximum number of pods to return (default 1000, at least 1).
     Returns:
-        List of pods with basic information similar to kubectl get pods output.
+        {"pods": [...], "truncated": bool}. "pods" holds basic information similar to
+        kubectl get pods output; "truncated" is true when more than max_items pods
+        matched and the list was cut off, so narrow by namespace or raise max_items.
     """
     client = await get_rancher()
-    response = await client.list_pods(cluster, namespace)
     
-    pods = []
-    for pod in response.get("items", []):
-        # Extract basic pod information
-        pod_info = {
-            "name": pod.get("metadata", {}).get("name"),
-            "namespace": pod.get("metadata", {}).get("namespace"),
-            "ready": f"{sum(1 for c in pod.get('status', {}).get('containerStatuses', []) if c.get('ready'))}/{len(pod.get('status', {}).get('containerStatuses', []))}",
-            "status": pod.get("status", {}).get("phase"),
-            "age": pod.get("metadata", {}).get("creationTimestamp"),
-        }
-        pods.append(pod_info)
+    max_items = max(1, max_items)
+    rows = []
+    append = rows.append
+    shape = _shape_pod
+    truncated = False
+    # read one pod past the cap to know whether anything was cut off;
+    # aclosing: stopping early releases the in-flight page request right away
+    async with aclosing(client.list_pods(cluster, namespace, limit=min(max_items + 1, 500))) as pods:
+        async for pod in pods:
+            if len(rows) >= max_items:
+                truncated = True
+                break
+            # keep only the small row; the raw pod is dropped as the stream moves on
+            append(shape(pod))
     
-    return pods
+    return {"pods": rows, "truncated": truncated}